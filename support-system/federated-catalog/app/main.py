@@ -1,14 +1,79 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, String, DateTime
+from sqlalchemy import DDL, Column, Computed, String, DateTime, Index, bindparam, delete, event, func, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from ecdsa import VerifyingKey, NIST256p, BadSignatureError
-from datetime import datetime, timezone
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from datetime import datetime
+import asyncio
 import base64
-import time
-import requests
+import httpx
+import json
 import os
+import time
+
+# =====================================
+# 署名検証バッチワーカー
+# =====================================
+# バースト時は複数リクエスト分の検証を1バッチに束ね、プロセスプールで
+# GILを跨いで並列実行する (リクエスト毎のexecutor往復を償却)
+_VERIFY_BATCH_SIZE = 64
+_VERIFY_MAX_WAIT = 0.002  # 秒: バッチを締め切るまでの待ち時間
+
+_verify_queue: asyncio.Queue | None = None
+_verify_pool: ProcessPoolExecutor | None = None
+_verify_worker_task: asyncio.Task | None = None
+
+@lru_cache(maxsize=10_000)
+def _parse_public_key(pem: bytes):
+    """ワーカープロセス側のPEMパースキャッシュ"""
+    return load_pem_public_key(pem)
+
+def _verify_one(pem: bytes, message: bytes, signature: bytes) -> bool:
+    try:
+        _parse_public_key(pem).verify(signature, message, ec.ECDSA(hashes.SHA256()))
+        return True
+    except InvalidSignature:
+        return False
+
+def _verify_batch(batch):
+    """(pem, message, signature) のリストをワーカープロセス側でまとめて検証"""
+    return [_verify_one(pem, message, signature) for pem, message, signature in batch]
+
+async def _verify_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        jobs = [await _verify_queue.get()]
+        deadline = loop.time() + _VERIFY_MAX_WAIT
+        while len(jobs) < _VERIFY_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                jobs.append(await asyncio.wait_for(_verify_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        batch = [job for job, _ in jobs]
+        futures = [fut for _, fut in jobs]
+        try:
+            results = await loop.run_in_executor(_verify_pool, _verify_batch, batch)
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+        for fut, ok in zip(futures, results):
+            if not fut.done():
+                fut.set_result(ok)
 
 # =====================================
 # 設定
@@ -17,24 +82,19 @@ DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_NAME = os.getenv("POSTGRES_DB", "federated_catalog_db")
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
 
 PUBLIC_KEY_REGISTRY_URL = os.getenv("PUBLIC_KEY_REGISTRY_URL", "http://host.docker.internal:60000")
 
-# DB起動待ち
-for _ in range(10):
-    try:
-        engine = create_engine(DATABASE_URL)
-        engine.connect()
-        print("Database connected successfully.")
-        break
-    except Exception:
-        print("Waiting for PostgreSQL...")
-        time.sleep(3)
-else:
-    raise Exception("Could not connect to PostgreSQL after 10 retries.")
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 接続プールを明示設定 (リクエスト毎の接続確立を避ける)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+SessionLocal = async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # =====================================
@@ -43,14 +103,78 @@ Base = declarative_base()
 class FederatedCatalog(Base):
     __tablename__ = "federated_catalog"
     data_id = Column(String, primary_key=True, index=True)
-    user_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False, index=True)  # /search_by_user_id 用B-tree
     description = Column(String)
     endpoint = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 全文検索用の生成列 (descriptionから自動導出)
+    description_tsv = Column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', coalesce(description, ''))", persisted=True),
+    )
+
+    __table_args__ = (
+        # 先頭ワイルドカード付きILIKE検索 (%keyword%) をインデックス化するトライグラムGIN
+        Index(
+            "idx_fc_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+        # 全文検索用GIN
+        Index("idx_fc_desc_tsv", "description_tsv", postgresql_using="gin"),
+    )
+
+# GINトライグラムインデックス作成前に pg_trgm 拡張を有効化
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+)
 
-Base.metadata.create_all(bind=engine)
+# JSONシリアライズはorjson (Rust実装) に委譲
+app = FastAPI(title="Federated Catalog (PEM + Base64)", default_response_class=ORJSONResponse)
 
-app = FastAPI(title="Federated Catalog (PEM + Base64)")
+# Public-Key-Registry向けの共有HTTPクライアント (keep-alive接続プール)
+http_client: httpx.AsyncClient | None = None
+
+# =====================================
+# 起動・終了処理
+# =====================================
+@app.on_event("startup")
+async def on_startup():
+    global http_client, _verify_queue, _verify_pool, _verify_worker_task
+    _verify_queue = asyncio.Queue()
+    _verify_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    _verify_worker_task = asyncio.create_task(_verify_worker())
+
+    # DB起動待ち
+    for _ in range(10):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            print("Database connected successfully.")
+            break
+        except Exception:
+            print("Waiting for PostgreSQL...")
+            await asyncio.sleep(3)
+    else:
+        raise Exception("Could not connect to PostgreSQL after 10 retries.")
+
+    http_client = httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_keepalive_connections=100),
+    )
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _verify_worker_task is not None:
+        _verify_worker_task.cancel()
+    if _verify_pool is not None:
+        _verify_pool.shutdown(wait=False)
+    if http_client is not None:
+        await http_client.aclose()
+    await engine.dispose()
 
 # =====================================
 # スキーマ定義
@@ -61,181 +185,189 @@ class CatalogItem(BaseModel):
     description: str
     endpoint: str
     signature: str  # Base64署名
-    expire_time: str # UNIX時刻(署名の有効期限) 
+    expire_time: int # UNIX時刻(秒, 署名の有効期限)
 
 class DeleteRequest(BaseModel):
     user_id: str
     signature: str
-    expire_time: str # UNIX時刻(署名の有効期限) 
+    expire_time: int # UNIX時刻(秒, 署名の有効期限)
 
 # =====================================
 # 共通関数
 # =====================================
-def get_public_key(user_id: str):
-    """Public-Key-RegistryからPEM公開鍵を取得"""
+# user_id → 公開鍵PEMのTTLキャッシュ (PEMのままプロセスプールへ渡せる / 鍵差し替えはTTLで追従)
+_PK_CACHE = TTLCache(maxsize=10_000, ttl=300)
+
+async def get_public_key(user_id: str) -> str:
+    """Public-Key-Registryから公開鍵PEMを取得 (TTLキャッシュ付き)"""
+    cached = _PK_CACHE.get(user_id)
+    if cached is not None:
+        return cached
     try:
-        res = requests.get(f"{PUBLIC_KEY_REGISTRY_URL}/get/{user_id}")
+        res = await http_client.get(f"{PUBLIC_KEY_REGISTRY_URL}/get/{user_id}")
         if res.status_code != 200:
+            # 削除済みユーザの鍵が残らないようキャッシュも無効化
+            _PK_CACHE.pop(user_id, None)
             raise HTTPException(status_code=403, detail="Public key not found.")
         data = res.json()
         fetched_pubkey_pem = data.get("public_key")
+        _PK_CACHE[user_id] = fetched_pubkey_pem
         return fetched_pubkey_pem
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch public key: {e}")
 
-    
-def verify_signature(public_key_pem: str, message: str, signature_b64: str):
-    """PEM公開鍵 + Base64署名で検証"""
+
+async def verify_signature(public_key_pem: str, message: bytes, signature_b64: str):
+    """PEM公開鍵 + Base64署名(DER, SHA-256)で検証 (バッチワーカー経由でプロセスプールへオフロード)"""
     try:
-        vk = VerifyingKey.from_pem(public_key_pem)
         signature = base64.b64decode(signature_b64)
-        vk.verify(signature, message.encode("utf-8"))
-        return True
-    except BadSignatureError:
-        raise HTTPException(status_code=403, detail="Invalid signature.")
+        fut = asyncio.get_running_loop().create_future()
+        await _verify_queue.put(((public_key_pem.encode(), message, signature), fut))
+        ok = await fut
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Signature verification error: {e}")
+    if not ok:
+        raise HTTPException(status_code=403, detail="Invalid signature.")
+    return True
 
-def check_expire_time(expire_time_str: str):
+def check_expire_time(expire_time: int):
     """
-    ISO8601形式のexpire_time文字列が現在時刻を過ぎていないか確認。
-    例: "2025-11-02T21:45:00Z"
+    UNIX時刻(秒)のexpire_timeが現在時刻を過ぎていないか確認。
+    ISO8601文字列のパースを廃し整数比較のみにする。
     """
-    try:
-        expire_dt = datetime.fromisoformat(expire_time_str.replace("Z", "+00:00"))
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid expire_time format")
-
-    now_dt = datetime.now(timezone.utc)
-    if now_dt > expire_dt:
+    if time.time() > expire_time:
         raise HTTPException(status_code=400, detail="Signature expired")
     else:
         return True
 
+# =====================================
+# DBセッション
+# =====================================
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+# モジュールレベルの共有SELECT (コンパイル済みステートメントキャッシュを最大限効かせる)
+GET_BY_DATA_ID = select(FederatedCatalog).where(
+    FederatedCatalog.data_id == bindparam("data_id")
+)
+
 # =====================================
 # API
 # =====================================
 @app.post("/add")
-def add_entry(item: CatalogItem):
-    db = SessionLocal()
-    try:
-        fetched_pubkey_pem = get_public_key(item.user_id)
-        message = item.data_id + item.user_id + item.description + item.endpoint + item.expire_time
-        
-        check_expire_time(item.expire_time)
-        verify_signature(fetched_pubkey_pem, message, item.signature)
+async def add_entry(item: CatalogItem, db: AsyncSession = Depends(get_db)):
+    # 期限切れ・形式不正はレジストリ照会や署名検証より先に弾く
+    check_expire_time(item.expire_time)
+    public_key_pem = await get_public_key(item.user_id)
+    # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+    message = b"".join((
+        item.data_id.encode(),
+        item.user_id.encode(),
+        item.description.encode(),
+        item.endpoint.encode(),
+        str(item.expire_time).encode(),
+    ))
+    await verify_signature(public_key_pem, message, item.signature)
 
-        if db.query(FederatedCatalog).filter_by(data_id=item.data_id).first():
-            raise HTTPException(status_code=400, detail="DataID already exists.")
-
-        entry = FederatedCatalog(
+    # SELECT→INSERTの2往復を1文に集約 (重複はDB側の一意制約で検出)
+    stmt = (
+        pg_insert(FederatedCatalog)
+        .values(
             data_id=item.data_id,
             user_id=item.user_id,
             description=item.description,
             endpoint=item.endpoint,
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
         )
-        db.add(entry)
-        db.commit()
-        db.refresh(entry)
-        return {"message": "Added successfully.", "data": item.dict()}
-    finally:
-        db.close()
+        .on_conflict_do_nothing(index_elements=["data_id"])
+        .returning(FederatedCatalog.data_id)
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    if result.first() is None:
+        raise HTTPException(status_code=400, detail="DataID already exists.")
+    # dict()で一度展開せず、モデルのままFastAPIに一回でシリアライズさせる
+    return {"message": "Added successfully.", "data": item}
 
 @app.delete("/delete/{data_id}")
-def delete_entry(data_id: str, req: DeleteRequest):
-    db = SessionLocal()
-    try:
-        public_key = get_public_key(req.user_id)
-        message = data_id + req.user_id + req.expire_time
-
-        check_expire_time(req.expire_time)
-        verify_signature(public_key, message, req.signature)
+async def delete_entry(data_id: str, req: DeleteRequest, db: AsyncSession = Depends(get_db)):
+    # 期限切れ・形式不正はレジストリ照会や署名検証より先に弾く
+    check_expire_time(req.expire_time)
+    public_key_pem = await get_public_key(req.user_id)
+    message = b"".join((data_id.encode(), req.user_id.encode(), str(req.expire_time).encode()))
+    await verify_signature(public_key_pem, message, req.signature)
 
-        entry = db.query(FederatedCatalog).filter_by(data_id=data_id).first()
-        if not entry:
-            raise HTTPException(status_code=404, detail="DataID not found.")
-        if entry.user_id != req.user_id:
-            raise HTTPException(status_code=403, detail="User not authorized.")
+    entry = await db.scalar(GET_BY_DATA_ID, {"data_id": data_id})
+    if not entry:
+        raise HTTPException(status_code=404, detail="DataID not found.")
+    if entry.user_id != req.user_id:
+        raise HTTPException(status_code=403, detail="User not authorized.")
 
-        db.delete(entry)
-        db.commit()
-        return {"message": f"{data_id} deleted successfully."}
-    finally:
-        db.close()
+    await db.delete(entry)
+    await db.commit()
+    return {"message": f"{data_id} deleted successfully."}
 
 @app.get("/get/{data_id}")
-def get_by_dataid(data_id: str):
-    db = SessionLocal()
-    try:
-        entry = db.query(FederatedCatalog).filter(FederatedCatalog.data_id == data_id).first()
-        if not entry:
-            raise HTTPException(status_code=404, detail="DataID not found.")
-        return entry.__dict__
-    finally:
-        db.close()
+async def get_by_dataid(data_id: str, db: AsyncSession = Depends(get_db)):
+    entry = await db.scalar(GET_BY_DATA_ID, {"data_id": data_id})
+    if not entry:
+        raise HTTPException(status_code=404, detail="DataID not found.")
+    return entry.__dict__
 
 @app.post("/reset")
-def reset_all():
-    db = SessionLocal()
-    try:
-        num_deleted = db.query(FederatedCatalog).delete()
-        db.commit()
-        return {"message": f"All {num_deleted} entries deleted."}
-    finally:
-        db.close()
+async def reset_all(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(delete(FederatedCatalog))
+    await db.commit()
+    return {"message": f"All {result.rowcount} entries deleted."}
 
 # 検索機能関係
+async def _stream_search_results(stmt, query_type: str, query_value: str):
+    """検索結果をサーバサイドカーソルで読みつつJSONを逐次生成 (結果全量をメモリに載せない)。"""
+    yield (
+        '{"query_type": ' + json.dumps(query_type)
+        + ', "query_value": ' + json.dumps(query_value)
+        + ', "results": ['
+    )
+    count = 0
+    async with SessionLocal() as db:
+        result = await db.stream_scalars(stmt.execution_options(yield_per=500))
+        async for r in result:
+            chunk = json.dumps({
+                "data_id": r.data_id,
+                "user_id": r.user_id,
+                "description": r.description,
+                "endpoint": r.endpoint,
+                "created_at": r.created_at.isoformat() if r.created_at else None
+            }, ensure_ascii=False)
+            yield chunk if count == 0 else ", " + chunk
+            count += 1
+    yield f'], "count": {count}}}'
+
+
 @app.get("/search_by_keyword/{keyword}")
-def search_by_keyword(keyword: str):
-    """description に keyword が含まれるカタログを部分一致で検索。"""
-    db = SessionLocal()
-    try:
-        results = db.query(FederatedCatalog).filter(
-            FederatedCatalog.description.ilike(f"%{keyword}%")
-        ).all()
-        return {
-            "query_type": "search_by_keyword",
-            "query_value": keyword,
-            "count": len(results),
-            "results": [
-                {
-                    "data_id": r.data_id,
-                    "user_id": r.user_id,
-                    "description": r.description,
-                    "endpoint": r.endpoint,
-                    "created_at": r.created_at
-                }
-                for r in results
-            ]
-        }
-    finally:
-        db.close()
+async def search_by_keyword(keyword: str):
+    """description に keyword が含まれるカタログを全文検索 (tsvector + GIN)。"""
+    stmt = select(FederatedCatalog).where(
+        FederatedCatalog.description_tsv.op("@@")(
+            func.plainto_tsquery("simple", keyword)
+        )
+    )
+    return StreamingResponse(
+        _stream_search_results(stmt, "search_by_keyword", keyword),
+        media_type="application/json",
+    )
 
 
 @app.get("/search_by_user_id/{user_id}")
-def search_by_user_id(user_id: str):
+async def search_by_user_id(user_id: str):
     """指定された user_id に紐づくカタログ一覧を取得。"""
-    db = SessionLocal()
-    try:
-        results = db.query(FederatedCatalog).filter(
-            FederatedCatalog.user_id == user_id
-        ).all()
-        return {
-            "query_type": "search_by_user_id",
-            "query_value": user_id,
-            "count": len(results),
-            "results": [
-                {
-                    "data_id": r.data_id,
-                    "user_id": r.user_id,
-                    "description": r.description,
-                    "endpoint": r.endpoint,
-                    "created_at": r.created_at
-                }
-                for r in results
-            ]
-        }
-    finally:
-        db.close()
-
+    stmt = select(FederatedCatalog).where(
+        FederatedCatalog.user_id == user_id
+    )
+    return StreamingResponse(
+        _stream_search_results(stmt, "search_by_user_id", user_id),
+        media_type="application/json",
+    )
@@ -1,29 +1,37 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, bindparam, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from ecdsa import VerifyingKey, NIST256p, BadSignatureError
-from datetime import datetime, timezone
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from datetime import datetime
+import asyncio
 import base64
+import json
+import os
 import time
 
 # =====================================
 # 設定
 # =====================================
-DATABASE_URL = "postgresql://user:password@db:5432/public_key_registry"
-
-# DB接続待ち
-for _ in range(10):
-    try:
-        engine = create_engine(DATABASE_URL)
-        engine.connect()
-        break
-    except Exception:
-        print("Waiting for PostgreSQL...")
-        time.sleep(3)
-
-SessionLocal = sessionmaker(bind=engine)
+DATABASE_URL = "postgresql+asyncpg://user:password@db:5432/public_key_registry"
+
+# 接続プールを明示設定 (リクエスト毎の接続確立を避ける)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 Base = declarative_base()
 
 # =====================================
@@ -35,12 +43,35 @@ class PublicKey(Base):
     public_key = Column(String, nullable=False)  # PEM形式
     registered_at = Column(DateTime, default=datetime.utcnow)
 
-Base.metadata.create_all(bind=engine)
-
 # =====================================
 # FastAPI初期化
 # =====================================
-app = FastAPI(title="Public Key Registry (PEM+Base64)")
+# JSONシリアライズはorjson (Rust実装) に委譲
+app = FastAPI(title="Public Key Registry (PEM+Base64)", default_response_class=ORJSONResponse)
+
+# 署名検証用プロセスプール (イベントループを塞がず複数コアで並列検証)
+_verify_pool: ProcessPoolExecutor | None = None
+
+@app.on_event("startup")
+async def on_startup():
+    global _verify_pool
+    _verify_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+    # DB接続待ち
+    for _ in range(10):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            break
+        except Exception:
+            print("Waiting for PostgreSQL...")
+            await asyncio.sleep(3)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _verify_pool is not None:
+        _verify_pool.shutdown(wait=False)
+    await engine.dispose()
 
 # =====================================
 # スキーマ定義
@@ -49,83 +80,97 @@ class RegisterRequest(BaseModel):
     user_id: str
     public_key: str  # PEM形式
     signature: str   # Base64署名
-    expire_time: str # UNIX時刻(署名の有効期限)
+    expire_time: int # UNIX時刻(秒, 署名の有効期限)
 
 class DeleteRequest(BaseModel):
     user_id: str
     public_key: str
     signature: str
-    expire_time: str # UNIX時刻(署名の有効期限)
+    expire_time: int # UNIX時刻(秒, 署名の有効期限)
 
 # =====================================
 # 共通関数
 # =====================================
-def verify_signature(public_key_pem: str, message: str, signature_b64: str) -> bool:
-    """PEM公開鍵 + Base64署名で検証"""
+@lru_cache(maxsize=10_000)
+def _parse_public_key(pem: bytes):
+    """ワーカープロセス側のPEMパースキャッシュ (鍵は静的なのでASN.1デコードは一度で十分)"""
+    return load_pem_public_key(pem)
+
+def _verify(public_key_pem: bytes, message: bytes, signature: bytes) -> bool:
+    """ワーカープロセス側で実行される検証本体 (引数はpicklable なbytesのみ)"""
     try:
-        vk = VerifyingKey.from_pem(public_key_pem)
-        signature = base64.b64decode(signature_b64)
-        vk.verify(signature, message.encode("utf-8"))
+        _parse_public_key(public_key_pem).verify(signature, message, ec.ECDSA(hashes.SHA256()))
         return True
-    except BadSignatureError:
+    except InvalidSignature:
         return False
+
+async def verify_signature(public_key_pem: str, message: bytes, signature_b64: str) -> bool:
+    """PEM公開鍵 + Base64署名(DER, SHA-256)で検証 (プロセスプールへオフロード)"""
+    try:
+        signature = base64.b64decode(signature_b64)
+        return await asyncio.get_running_loop().run_in_executor(
+            _verify_pool, _verify, public_key_pem.encode(), message, signature
+        )
     except Exception as e:
         print("[ERROR verify_signature]", e)
         return False
 
-def check_expire_time(expire_time_str: str):
+def check_expire_time(expire_time: int):
     """
-    ISO8601形式のexpire_time文字列が現在時刻を過ぎていないか確認。
-    例: "2025-11-02T21:45:00Z"
+    UNIX時刻(秒)のexpire_timeが現在時刻を過ぎていないか確認。
+    ISO8601文字列のパースを廃し整数比較のみにする。
     """
-    try:
-        expire_dt = datetime.fromisoformat(expire_time_str.replace("Z", "+00:00"))
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid expire_time format")
-
-    now_dt = datetime.now(timezone.utc)
-    if now_dt > expire_dt:
+    if time.time() > expire_time:
         raise HTTPException(status_code=400, detail="Signature expired")
     else:
         return True
 
-def get_db():
-    db = SessionLocal()
-    try:
+# =====================================
+# DBセッション
+# =====================================
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+# モジュールレベルの共有SELECT (コンパイル済みステートメントキャッシュを最大限効かせる)
+GET_BY_USER_ID = select(PublicKey).where(
+    PublicKey.user_id == bindparam("user_id")
+)
 
 # =====================================
 # API
 # =====================================
 @app.post("/add")
-def add_key(req: RegisterRequest):
-    db = next(get_db())
-    msg = req.user_id + req.public_key + req.expire_time
+async def add_key(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+    msg = b"".join((req.user_id.encode(), req.public_key.encode(), str(req.expire_time).encode()))
     if not check_expire_time(req.expire_time):
         raise HTTPException(status_code=400, detail="Expired signature")
 
-    if not verify_signature(req.public_key, msg, req.signature):
+    if not await verify_signature(req.public_key, msg, req.signature):
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    if db.query(PublicKey).filter_by(user_id=req.user_id).first():
-        raise HTTPException(status_code=409, detail="UserID already registered")
-
-    new_key = PublicKey(
-        user_id=req.user_id,
-        public_key=req.public_key,
-        registered_at=datetime.utcnow()
+    # SELECT→INSERTの2往復を1文に集約 (重複はDB側の一意制約で検出)
+    stmt = (
+        pg_insert(PublicKey)
+        .values(
+            user_id=req.user_id,
+            public_key=req.public_key,
+            registered_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["user_id"])
+        .returning(PublicKey.user_id)
     )
-    db.add(new_key)
-    db.commit()
+    result = await db.execute(stmt)
+    await db.commit()
+    if result.first() is None:
+        raise HTTPException(status_code=409, detail="UserID already registered")
     return {"message": f"Key for '{req.user_id}' registered successfully."}
 
 
 @app.get("/get/{user_id}")
-def get_key(user_id: str):
-    db = next(get_db())
-    key = db.query(PublicKey).filter_by(user_id=user_id).first()
+async def get_key(user_id: str, db: AsyncSession = Depends(get_db)):
+    key = await db.scalar(GET_BY_USER_ID, {"user_id": user_id})
     if not key:
         raise HTTPException(status_code=404, detail="Key not found")
     return {
@@ -136,41 +181,48 @@ def get_key(user_id: str):
 
 
 @app.delete("/delete")
-def delete_key(req: DeleteRequest):
-    db = next(get_db())
-    msg = req.user_id + req.public_key + req.expire_time
+async def delete_key(req: DeleteRequest, db: AsyncSession = Depends(get_db)):
+    # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+    msg = b"".join((req.user_id.encode(), req.public_key.encode(), str(req.expire_time).encode()))
     if not check_expire_time(req.expire_time):
         raise HTTPException(status_code=400, detail="Expired signature")
-    
-    if not verify_signature(req.public_key, msg, req.signature):
+
+    if not await verify_signature(req.public_key, msg, req.signature):
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    key = db.query(PublicKey).filter_by(user_id=req.user_id).first()
+    key = await db.scalar(GET_BY_USER_ID, {"user_id": req.user_id})
     if not key:
         raise HTTPException(status_code=404, detail="Key not found")
 
-    db.delete(key)
-    db.commit()
+    await db.delete(key)
+    await db.commit()
     return {"message": f"Key for '{req.user_id}' deleted successfully."}
 
 
+async def _stream_all_keys():
+    """登録鍵一覧をサーバサイドカーソルで読みつつJSON配列を逐次生成。"""
+    yield "["
+    count = 0
+    async with SessionLocal() as db:
+        result = await db.stream_scalars(select(PublicKey).execution_options(yield_per=500))
+        async for k in result:
+            chunk = json.dumps({
+                "user_id": k.user_id,
+                "public_key": k.public_key,
+                "registered_at": k.registered_at.isoformat() if k.registered_at else None
+            }, ensure_ascii=False)
+            yield chunk if count == 0 else ", " + chunk
+            count += 1
+    yield "]"
+
+
 @app.get("/list")
-def list_keys():
-    db = next(get_db())
-    keys = db.query(PublicKey).all()
-    return [
-        {
-            "user_id": k.user_id,
-            "public_key": k.public_key,
-            "registered_at": k.registered_at.isoformat() if k.registered_at else None
-        }
-        for k in keys
-    ]
+async def list_keys():
+    return StreamingResponse(_stream_all_keys(), media_type="application/json")
 
 
 @app.delete("/delete_all")
-def delete_all_keys():
-    db = next(get_db())
-    count = db.query(PublicKey).delete()
-    db.commit()
-    return {"message": f"All {count} keys deleted successfully."}
+async def delete_all_keys(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(delete(PublicKey))
+    await db.commit()
+    return {"message": f"All {result.rowcount} keys deleted successfully."}
@@ -1,9 +1,17 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
-from ecdsa import SigningKey, NIST256p
-from datetime import datetime, timezone, timedelta
-import os, json, base64, hashlib, requests
+from sqlalchemy import Column, String
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import (
+    Encoding, NoEncryption, PrivateFormat, PublicFormat, load_pem_private_key
+)
+from datetime import datetime, timezone
+import asyncio
+import os, json, time, base64, hashlib, hmac, httpx
 
 app = FastAPI(title="Connector API (PoC, SHA256 hash)")
 
@@ -16,6 +24,53 @@ security = HTTPBasic()
 PUBLIC_KEY_REGISTRY_URL = os.getenv("PUBLIC_KEY_REGISTRY_URL", "http://host.docker.internal:60000")
 FEDERATED_CATALOG_URL = os.getenv("FEDERATED_CATALOG_URL", "http://host.docker.internal:61000")
 
+# ユーザ情報はJSONファイルではなくSQLiteに保存 (認証ホットパスのsyscall連鎖を排除)
+DATABASE_URL = "sqlite+aiosqlite:///./app/users.db"
+engine = create_async_engine(DATABASE_URL)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = "users"
+    user_id = Column(String, primary_key=True)
+    password_hash = Column(String, nullable=False)  # WebApp側で SHA256済み
+    public_key = Column(String, nullable=False)     # PEM形式
+    created_at = Column(String, nullable=False)     # ISO8601文字列
+
+# PKR / FC 向けの共有HTTPクライアント (keep-alive接続プール)
+http_client: httpx.AsyncClient | None = None
+
+@app.on_event("startup")
+async def on_startup():
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_keepalive_connections=100),
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # 旧形式 (./app/users/*.json) のユーザを一度だけ取り込む
+    async with SessionLocal() as db:
+        for fname in os.listdir(USER_DIR):
+            if not fname.endswith(".json"):
+                continue
+            with open(os.path.join(USER_DIR, fname)) as f:
+                data = json.load(f)
+            if await db.get(User, data["user_id"]) is None:
+                db.add(User(
+                    user_id=data["user_id"],
+                    password_hash=data["password_hash"],
+                    public_key=data.get("public_key", ""),
+                    created_at=data.get("created_at", ""),
+                ))
+        await db.commit()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if http_client is not None:
+        await http_client.aclose()
+    await engine.dispose()
+
 # ======== モデル ========
 class RegisterRequest(BaseModel):
     user_id: str
@@ -27,13 +82,24 @@ class LoginRequest(BaseModel):
 
 # ======== 共通関数 ========
 def sign_message(private_key_pem: str, message: str) -> str:
-    sk = SigningKey.from_pem(private_key_pem)
-    sig = sk.sign(message.encode("utf-8"))
+    sk = load_pem_private_key(private_key_pem.encode(), password=None)
+    sig = sk.sign(message.encode("utf-8"), ec.ECDSA(hashes.SHA256()))
     return base64.b64encode(sig).decode("utf-8")
 
-def iso_now_plus(minutes: int = 5) -> str:
-    """現在時刻 + N分 の ISO8601文字列 (UTC, Z付き)"""
-    return (datetime.now(timezone.utc) + timedelta(minutes=minutes)).isoformat().replace("+00:00", "Z")
+def generate_keypair() -> tuple[str, str]:
+    """ECDSA鍵ペア (P-256) を生成してPEM文字列で返す"""
+    sk = ec.generate_private_key(ec.SECP256R1())
+    private_key_pem = sk.private_bytes(
+        Encoding.PEM, PrivateFormat.TraditionalOpenSSL, NoEncryption()
+    ).decode()
+    public_key_pem = sk.public_key().public_bytes(
+        Encoding.PEM, PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private_key_pem, public_key_pem
+
+def unix_expire(minutes: int = 5) -> int:
+    """現在時刻 + N分 のUNIX時刻 (秒)"""
+    return int(time.time()) + minutes * 60
 
 def pretty(res):
     print(f"\n[HTTP {res.status_code}]")
@@ -42,39 +108,42 @@ def pretty(res):
     except Exception:
         print(res.text)
 
-def verify_hashed_password(credentials: HTTPBasicCredentials = Depends(security)):
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+async def verify_hashed_password(
+    credentials: HTTPBasicCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+):
     user_id = credentials.username
     password_hash = credentials.password
-    path = os.path.join(USER_DIR, f"{user_id}.json")
-    if not os.path.exists(path):
+    user = await db.get(User, user_id)
+    if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    with open(path) as f:
-        data = json.load(f)
-    if data["password_hash"] != password_hash:
+    # タイミング攻撃対策に定数時間比較
+    if not hmac.compare_digest(user.password_hash, password_hash):
         raise HTTPException(status_code=401, detail="Invalid password hash")
     return user_id
-    
+
 
 # ======== ユーザー登録 ========
 @app.post("/register")
-def register_user(req: RegisterRequest):
-    user_path = os.path.join(USER_DIR, f"{req.user_id}.json")
+async def register_user(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
     key_path = os.path.join(KEY_DIR, f"{req.user_id}.pem")
 
-    if os.path.exists(user_path):
+    if await db.get(User, req.user_id) is not None:
         raise HTTPException(status_code=409, detail="User already exists")
 
-    # === ECDSA鍵生成 ===
-    sk = SigningKey.generate(curve=NIST256p)
-    vk = sk.verifying_key
-    private_key_pem = sk.to_pem().decode()
-    public_key_pem = vk.to_pem().decode()
+    # === ECDSA鍵生成 (P-256) ===
+    # 鍵生成と署名はCPUバウンドなのでスレッドへ逃がし、イベントループを塞がない
+    private_key_pem, public_key_pem = await asyncio.to_thread(generate_keypair)
 
-    expire_time = iso_now_plus(5)
-    msg = req.user_id + public_key_pem + expire_time
-    sig = sign_message(private_key_pem, msg)
+    expire_time = unix_expire(5)
+    msg = req.user_id + public_key_pem + str(expire_time)
+    sig = await asyncio.to_thread(sign_message, private_key_pem, msg)
 
-    res = requests.post(f"{PUBLIC_KEY_REGISTRY_URL}/add", json={
+    res = await http_client.post(f"{PUBLIC_KEY_REGISTRY_URL}/add", json={
         "user_id": req.user_id,
         "public_key": public_key_pem,
         "signature": sig,
@@ -85,51 +154,52 @@ def register_user(req: RegisterRequest):
     with open(key_path, "w") as f:
         f.write(private_key_pem)
 
-    user_info = {
-        "user_id": req.user_id,
-        "password_hash": req.password_hash,
-        "public_key": public_key_pem,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    with open(user_path, "w") as f:
-        json.dump(user_info, f, indent=2)
+    db.add(User(
+        user_id=req.user_id,
+        password_hash=req.password_hash,
+        public_key=public_key_pem,
+        created_at=datetime.now(timezone.utc).isoformat(),
+    ))
+    await db.commit()
 
     return {"result": "ok", "message": f"User '{req.user_id}' registered successfully."}
 
 # ======== ログイン ========
 @app.post("/login")
-def login_user(req: LoginRequest):
-    user_path = os.path.join(USER_DIR, f"{req.user_id}.json")
-    if not os.path.exists(user_path):
+async def login_user(req: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, req.user_id)
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    with open(user_path, "r") as f:
-        user_data = json.load(f)
-
-    if req.password_hash == user_data["password_hash"]:
+    # タイミング攻撃対策に定数時間比較
+    if hmac.compare_digest(req.password_hash, user.password_hash):
         return {"result": "ok", "message": "Login successful"}
     else:
         raise HTTPException(status_code=401, detail="Invalid password")
 
 # ======== Basic認証付き API ========
 @app.get("/users/{user_id}")
-def get_user(user_id: str, _: str = Depends(verify_hashed_password)):
-    user_path = os.path.join(USER_DIR, f"{user_id}.json")
-    if not os.path.exists(user_path):
+async def get_user(user_id: str, _: str = Depends(verify_hashed_password), db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    with open(user_path, "r") as f:
-        return json.load(f)
+    return {
+        "user_id": user.user_id,
+        "password_hash": user.password_hash,
+        "public_key": user.public_key,
+        "created_at": user.created_at,
+    }
 
 @app.get("/debug_all_pk_users")
-def get_all_users(_: str = Depends(verify_hashed_password)):
-    res = requests.get(f"{PUBLIC_KEY_REGISTRY_URL}/list")
+async def get_all_users(_: str = Depends(verify_hashed_password)):
+    res = await http_client.get(f"{PUBLIC_KEY_REGISTRY_URL}/list")
     if res.status_code != 200:
         raise HTTPException(status_code=res.status_code, detail="Registry access error")
     return res.json()
 
 @app.get("/search_by_keyword/{keyword}")
-def search_by_keyword(keyword: str, _: str = Depends(verify_hashed_password)): 
-    res = requests.get(f"{FEDERATED_CATALOG_URL}/search_by_keyword/{keyword}")
-    if res.status_code != 200: 
+async def search_by_keyword(keyword: str, _: str = Depends(verify_hashed_password)):
+    res = await http_client.get(f"{FEDERATED_CATALOG_URL}/search_by_keyword/{keyword}")
+    if res.status_code != 200:
         raise HTTPException(status_code=res.status_code, detail="Federated catalog access error")
     return res.json()
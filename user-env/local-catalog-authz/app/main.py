@@ -1,15 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from sqlalchemy import (
-    create_engine, Column, String, DateTime, ForeignKey, func, PrimaryKeyConstraint
+    Column, String, DateTime, ForeignKey, Index, bindparam, func, select, delete,
+    PrimaryKeyConstraint
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from ecdsa import VerifyingKey, NIST256p, BadSignatureError
+from sqlalchemy.orm import relationship
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timezone
+import asyncio
 import base64
-import time
-import requests
+import httpx
 import os
 
 # =====================================
@@ -19,24 +29,20 @@ DB_USER = os.getenv("POSTGRES_USER", "postgres")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_NAME = os.getenv("POSTGRES_DB", "local_catalog_authz_db")
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
 
 PUBLIC_KEY_REGISTRY_URL = os.getenv("PUBLIC_KEY_REGISTRY_URL", "http://host.docker.internal:60000")
 
-# DB起動待ち
-for _ in range(10):
-    try:
-        engine = create_engine(DATABASE_URL)
-        engine.connect()
-        print("Database connected successfully.")
-        break
-    except Exception:
-        print("Waiting for PostgreSQL...")
-        time.sleep(3)
-else:
-    raise Exception("Could not connect to PostgreSQL after 10 retries.")
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 接続プールを明示設定 (デフォルトpool_size=5では高負荷時にQueuePool枯渇で詰まる)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+SessionLocal = async_sessionmaker(engine, autocommit=False, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # =====================================
@@ -46,12 +52,15 @@ class LocalCatalog(Base):
     __tablename__ = "local_catalog"
     data_id = Column(String, primary_key=True, index=True)
     description = Column(String)
-    admin_id = Column(String, nullable=False)
+    admin_id = Column(String, nullable=False, index=True)  # admin_id参照用B-tree
     endpoint = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # 一対多（Data 1件に複数のAuthorization）
-    authorizations = relationship("LocalAuthorization", cascade="all, delete-orphan")
+    # 削除はFKのON DELETE CASCADEに任せる (ORMが子行をフェッチして1行ずつDELETEしない)
+    authorizations = relationship(
+        "LocalAuthorization", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class LocalAuthorization(Base):
@@ -63,19 +72,62 @@ class LocalAuthorization(Base):
 
     __table_args__ = (
         PrimaryKeyConstraint("data_id", "access_grantee_id", name="pk_authz"),
+        # get_authz の data_id + expire_at 範囲検索をインデックススキャン化する複合B-tree
+        Index("ix_authz_data_expire", "data_id", "expire_at"),
     )
 
-Base.metadata.create_all(bind=engine)
-
 # =====================================
 # FastAPI アプリ設定
 # =====================================
+# JSONシリアライズはorjson (Rust実装) に委譲 (datetimeもネイティブにRFC3339化)
 app = FastAPI(
     title="Local Catalog AuthZ Service",
     description="Local service managing dataset metadata and access authorizations (AuthZ) in PostgreSQL.",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# PKR向けの共有HTTPクライアント (keep-alive接続プール)
+http_client: httpx.AsyncClient | None = None
+
+# 署名検証用プロセスプール (イベントループを塞がず複数コアで並列検証)
+_verify_pool: ProcessPoolExecutor | None = None
+
+# =====================================
+# 起動・終了処理
+# =====================================
+@app.on_event("startup")
+async def on_startup():
+    global http_client, _verify_pool
+    _verify_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+    # DB起動待ち
+    for _ in range(10):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            print("Database connected successfully.")
+            break
+        except Exception:
+            print("Waiting for PostgreSQL...")
+            await asyncio.sleep(3)
+    else:
+        raise Exception("Could not connect to PostgreSQL after 10 retries.")
+
+    # keep-alive接続数とタイムアウトを明示 (ハンドラがPKR応答待ちで張り付かないように)
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(3, connect=1),
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _verify_pool is not None:
+        _verify_pool.shutdown(wait=False)
+    if http_client is not None:
+        await http_client.aclose()
+    await engine.dispose()
+
 # =====================================
 # スキーマ定義
 # =====================================
@@ -93,7 +145,7 @@ class AuthZItem(BaseModel):
     expire_at: str  # ISO8601形式で送信 (例: "2025-11-03T12:00:00Z")
     expire_time: str
     signature: str
-    
+
 # データ取得用(これは、カタログ情報、認可情報両方で使用する)
 class SignedGetRequest(BaseModel):
     """署名付きデータ取得・認可取得用リクエストスキーマ。管理者IDの署名が必須。"""
@@ -120,30 +172,63 @@ class SignedDeleteAuthZRequest(BaseModel):
 # =====================================
 # 共通関数
 # =====================================
-def get_public_key(user_id: str):
-    """Public-Key-RegistryからPEM公開鍵を取得"""
+# user_id → 公開鍵PEMのTTLキャッシュ (鍵差し替えはTTLで追従)
+_pk_cache = TTLCache(maxsize=1024, ttl=300)
+
+async def get_public_key(user_id: str):
+    """Public-Key-RegistryからPEM公開鍵を取得 (TTLキャッシュ付き)"""
+    cached = _pk_cache.get(user_id)
+    if cached is not None:
+        return cached
     try:
-        res = requests.get(f"{PUBLIC_KEY_REGISTRY_URL}/get/{user_id}")
+        res = await http_client.get(f"{PUBLIC_KEY_REGISTRY_URL}/get/{user_id}")
         if res.status_code != 200:
             raise HTTPException(status_code=403, detail="Public key not found.")
         data = res.json()
         fetched_pubkey_pem = data.get("public_key")
+        _pk_cache[user_id] = fetched_pubkey_pem
         return fetched_pubkey_pem
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch public key: {e}")
 
-    
-def verify_signature(public_key_pem: str, message: str, signature_b64: str):
-    """PEM公開鍵 + Base64署名で検証"""
+
+@lru_cache(maxsize=1024)
+def _parse_public_key(pem: bytes):
+    """ワーカープロセス側のPEMパースキャッシュ (鍵は静的なのでASN.1デコードは一度で十分)"""
+    return load_pem_public_key(pem)
+
+def _verify(public_key_pem: bytes, message: bytes, signature: bytes) -> bool:
+    """ワーカープロセス側で実行される検証本体 (引数はpicklableなbytesのみ)"""
     try:
-        vk = VerifyingKey.from_pem(public_key_pem)
-        signature = base64.b64decode(signature_b64)
-        vk.verify(signature, message.encode("utf-8"))
+        _parse_public_key(public_key_pem).verify(signature, message, ec.ECDSA(hashes.SHA256()))
         return True
-    except BadSignatureError:
-        raise HTTPException(status_code=403, detail="Invalid signature.")
+    except InvalidSignature:
+        return False
+
+async def verify_signature(public_key_pem: str, message: bytes, signature_b64: str):
+    """PEM公開鍵 + Base64署名(DER, SHA-256)で検証 (プロセスプールへオフロード)"""
+    try:
+        signature = base64.b64decode(signature_b64)
+        ok = await asyncio.get_running_loop().run_in_executor(
+            _verify_pool, _verify, public_key_pem.encode(), message, signature
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Signature verification error: {e}")
+    if not ok:
+        raise HTTPException(status_code=403, detail="Invalid signature.")
+    return True
+
+@lru_cache(maxsize=4096)
+def _parse_expire_time(expire_time_str: str) -> datetime:
+    """同一ISO8601文字列の再パースを避けるキャッシュ。
+
+    expire_time/expire_atの生文字列は署名対象メッセージの一部なので、
+    Pydantic側でdatetime化すると元の表記が失われ検証が壊れる。
+    文字列のまま受けてパース結果だけをキャッシュする。
+    """
+    return datetime.fromisoformat(expire_time_str.replace("Z", "+00:00"))
 
 def check_expire_time(expire_time_str: str):
     """
@@ -151,7 +236,7 @@ def check_expire_time(expire_time_str: str):
     例: "2025-11-02T21:45:00Z"
     """
     try:
-        expire_dt = datetime.fromisoformat(expire_time_str.replace("Z", "+00:00"))
+        expire_dt = _parse_expire_time(expire_time_str)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid expire_time format")
 
@@ -161,175 +246,204 @@ def check_expire_time(expire_time_str: str):
     else:
         return True
 
-def get_admin_id_by_data_id(db, data_id: str) -> str:
+# モジュールレベルの共有SELECT (コンパイル済みステートメントキャッシュを最大限効かせる)
+GET_ADMIN_ID = select(LocalCatalog.admin_id).where(
+    LocalCatalog.data_id == bindparam("data_id")
+)
+GET_VALID_AUTHZ = select(LocalAuthorization).where(
+    LocalAuthorization.data_id == bindparam("data_id"),
+    LocalAuthorization.expire_at > bindparam("now"),
+)
+
+# data_id → admin_id のTTLキャッシュ。管理者はデータ登録後に変わらないため、
+# 削除→再登録の追従 (delete_data/resetでの無効化 + TTL) だけ面倒を見ればよい。
+# キャッシュヒット時はDB往復ごと消え、PKR鍵取得と直列だった2往復が1往復以下になる。
+_admin_cache = TTLCache(maxsize=4096, ttl=300)
+
+async def get_admin_id_by_data_id(db: AsyncSession, data_id: str) -> str:
     """指定された data_id に対応する管理者ID (admin_id) を取得する共通関数。対応するデータが存在しない場合は 404 を返す。"""
+    cached = _admin_cache.get(data_id)
+    if cached is not None:
+        return cached
     try:
-        entry = db.query(LocalCatalog.admin_id).filter_by(data_id=data_id).first()
-        if not entry:
+        admin_id = await db.scalar(GET_ADMIN_ID, {"data_id": data_id})
+        if not admin_id:
             raise HTTPException(status_code=404, detail=f"DataID '{data_id}' not found in catalog.")
-        return entry.admin_id
+        _admin_cache[data_id] = admin_id
+        return admin_id
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve admin_id for DataID '{data_id}': {e}")
 
 
-    
+
 # =====================================
 # DBセッション
 # =====================================
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-        
+
 
 # =====================================
 # API エンドポイント
 # =====================================
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Local Catalog AuthZ Server running"}
 
 
 # ---- データ登録 ----
 @app.post("/add_data")
-def add_data(item: DataItem):
-    db = next(get_db())
-    try:
-        # 有効期限切れと公開鍵を取得して署名検証
+async def add_data(item: DataItem, db: AsyncSession = Depends(get_db)):
+    # トランザクションスコープ (正常終了でcommit / 例外でrollback)
+    async with db.begin():
+        # 有効期限切れを確認
         check_expire_time(item.expire_time)
-        fetched_pubkey_pem = get_public_key(item.admin_id)
-        msg = item.data_id + item.description + item.admin_id + item.endpoint + item.expire_time
-        verify_signature(fetched_pubkey_pem, msg, item.signature)
-        
-        if db.query(LocalCatalog).filter_by(data_id=item.data_id).first():
+        # 重複は署名検証より先に安価なPK参照で弾く (再送時に検証コストを払わない)
+        if await db.get(LocalCatalog, item.data_id):
             raise HTTPException(status_code=400, detail="DataID already exists.")
-        new_entry = LocalCatalog(
-            data_id=item.data_id,
-            description=item.description,
-            admin_id=item.admin_id,
-            endpoint=item.endpoint,
+        # 公開鍵を取得して署名検証
+        fetched_pubkey_pem = await get_public_key(item.admin_id)
+        # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+        msg = b"".join((
+            item.data_id.encode(),
+            (item.description or "").encode(),
+            item.admin_id.encode(),
+            item.endpoint.encode(),
+            item.expire_time.encode(),
+        ))
+        await verify_signature(fetched_pubkey_pem, msg, item.signature)
+
+        # SELECT→INSERTの2往復を1文に集約 (重複はDB側の主キー制約で検出)
+        stmt = (
+            pg_insert(LocalCatalog)
+            .values(
+                data_id=item.data_id,
+                description=item.description,
+                admin_id=item.admin_id,
+                endpoint=item.endpoint,
+            )
+            .on_conflict_do_nothing(index_elements=["data_id"])
+            .returning(LocalCatalog.data_id)
         )
-        db.add(new_entry)
-        db.commit()
+        result = await db.execute(stmt)
+        if result.first() is None:
+            raise HTTPException(status_code=400, detail="DataID already exists.")
         return {"message": f"Data {item.data_id} registered successfully."}
-    finally:
-        db.close()
 
 # ---- 認可登録 (AuthZ) ----
 @app.post("/add_authz")
-def add_authz(item: AuthZItem):
-    db =next(get_db())
-    try:
-        # 有効期限切れと公開鍵を取得して署名検証
+async def add_authz(item: AuthZItem, db: AsyncSession = Depends(get_db)):
+    # トランザクションスコープ (正常終了でcommit / 例外でrollback)
+    async with db.begin():
+        # 有効期限切れを確認
         check_expire_time(item.expire_time)
-        admin_id = get_admin_id_by_data_id(db, item.data_id)
-        fetched_pubkey_pem = get_public_key(admin_id)
-        msg = item.data_id + item.access_grantee_id + item.expire_at + item.expire_time
-        verify_signature(fetched_pubkey_pem, msg, item.signature)
-        
-        if not db.query(LocalCatalog).filter_by(data_id=item.data_id).first():
-            raise HTTPException(status_code=404, detail="DataID not found.")
-        existing = db.query(LocalAuthorization).filter_by(
-            data_id=item.data_id, access_grantee_id=item.access_grantee_id
-        ).first()
-        if existing:
+        admin_id = await get_admin_id_by_data_id(db, item.data_id)
+        # 重複は署名検証より先に安価なPK参照で弾く (再送時に検証コストを払わない)
+        if await db.get(LocalAuthorization, (item.data_id, item.access_grantee_id)):
             raise HTTPException(status_code=400, detail="AuthZ already exists.")
+        # 公開鍵を取得して署名検証
+        fetched_pubkey_pem = await get_public_key(admin_id)
+        # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+        msg = b"".join((
+            item.data_id.encode(),
+            item.access_grantee_id.encode(),
+            item.expire_at.encode(),
+            item.expire_time.encode(),
+        ))
+        await verify_signature(fetched_pubkey_pem, msg, item.signature)
+
+        # DataIDの存在は get_admin_id_by_data_id で確認済み
 
         # 有効期限をISO8601文字列からdatetimeに変換
         try:
-            expire_dt = datetime.fromisoformat(item.expire_at.replace("Z", "+00:00"))
+            expire_dt = _parse_expire_time(item.expire_at)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid expire_at format")
 
-        new_authz = LocalAuthorization(
-            data_id=item.data_id,
-            access_grantee_id=item.access_grantee_id,
-            expire_at=expire_dt,
+        # SELECT→INSERTの2往復を1文に集約 (重複はDB側の複合主キー制約で検出)
+        stmt = (
+            pg_insert(LocalAuthorization)
+            .values(
+                data_id=item.data_id,
+                access_grantee_id=item.access_grantee_id,
+                expire_at=expire_dt,
+            )
+            .on_conflict_do_nothing(index_elements=["data_id", "access_grantee_id"])
+            .returning(LocalAuthorization.data_id)
         )
-        db.add(new_authz)
-        db.commit()
+        result = await db.execute(stmt)
+        if result.first() is None:
+            raise HTTPException(status_code=400, detail="AuthZ already exists.")
         return {"message": f"AuthZ added for {item.access_grantee_id} (expires {item.expire_at})."}
-    finally:
-        db.close()
 
 
 # ---- データ情報取得(署名必要) ----
 @app.post("/get_data/{data_id}")
-def get_data(data_id: str, req: SignedGetRequest):
-    db = next(get_db())
-    try:
-        entry = db.query(LocalCatalog).filter_by(data_id=data_id).first()
-        if not entry:
-            raise HTTPException(status_code=404, detail="DataID not found.")
-        if req.admin_id != entry.admin_id:
-            raise HTTPException(status_code=403, detail="User not authorized.")
-
-        # 公開鍵を取得して署名検証
-        check_expire_time(req.expire_time)
-        fetched_pubkey_pem = get_public_key(req.admin_id)
-        verify_signature(fetched_pubkey_pem, req.expire_time, req.signature)
-
-        # 認証成功 → データ返却
-        return {
-            "data_id": entry.data_id,
-            "description": entry.description,
-            "admin_id": entry.admin_id,
-            "endpoint": entry.endpoint,
-            "created_at": entry.created_at,
-        }
-    finally:
-        db.close()
+async def get_data(data_id: str, req: SignedGetRequest, db: AsyncSession = Depends(get_db)):
+    entry = await db.get(LocalCatalog, data_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="DataID not found.")
+    if req.admin_id != entry.admin_id:
+        raise HTTPException(status_code=403, detail="User not authorized.")
+
+    # 公開鍵を取得して署名検証
+    check_expire_time(req.expire_time)
+    fetched_pubkey_pem = await get_public_key(req.admin_id)
+    await verify_signature(fetched_pubkey_pem, req.expire_time.encode(), req.signature)
+
+    # 認証成功 → データ返却
+    return {
+        "data_id": entry.data_id,
+        "description": entry.description,
+        "admin_id": entry.admin_id,
+        "endpoint": entry.endpoint,
+        "created_at": entry.created_at,
+    }
 
 """認可情報取得(管理者のデジタル署名が必須)Public-Key-Registryで公開鍵を取得して署名検証。"""
 @app.post("/get_authz/{data_id}")
-def get_authz(data_id: str, req: SignedGetRequest):
-    db = next(get_db())
-    try:
-        # 1. 対象データ取得
-        entry = db.query(LocalCatalog).filter_by(data_id=data_id).first()
-        if not entry:
-            raise HTTPException(status_code=404, detail="DataID not found.")
-        # 2. 管理者確認
-        if req.admin_id != entry.admin_id:
-            raise HTTPException(status_code=403, detail="User not authorized.")
-        # 3. 有効期限チェック
-        check_expire_time(req.expire_time)
-        # 4. 公開鍵取得 & 署名検証
-        fetched_pubkey_pem = get_public_key(req.admin_id)
-        verify_signature(fetched_pubkey_pem, req.expire_time, req.signature)
-        # 5. 有効な認可情報のみ返却
-        now = datetime.now(timezone.utc)
-        results = db.query(LocalAuthorization).filter(
-            LocalAuthorization.data_id == data_id,
-            LocalAuthorization.expire_at > now
-        ).all()
-        return {
-            "data_id": data_id,
-            "valid_authz_count": len(results),
-            "valid_authz": [
-                {
-                    "access_grantee_id": r.access_grantee_id,
-                    "expire_at": r.expire_at,
-                } for r in results
-            ]
-        }
-    finally:
-        db.close()
-
-
-
-        
+async def get_authz(data_id: str, req: SignedGetRequest, db: AsyncSession = Depends(get_db)):
+    # 1. 対象データ取得
+    entry = await db.get(LocalCatalog, data_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="DataID not found.")
+    # 2. 管理者確認
+    if req.admin_id != entry.admin_id:
+        raise HTTPException(status_code=403, detail="User not authorized.")
+    # 3. 有効期限チェック
+    check_expire_time(req.expire_time)
+    # 4. 公開鍵取得 & 署名検証
+    fetched_pubkey_pem = await get_public_key(req.admin_id)
+    await verify_signature(fetched_pubkey_pem, req.expire_time.encode(), req.signature)
+    # 5. 有効な認可情報のみ返却
+    now = datetime.now(timezone.utc)
+    results = (await db.scalars(GET_VALID_AUTHZ, {"data_id": data_id, "now": now})).all()
+    return {
+        "data_id": data_id,
+        "valid_authz_count": len(results),
+        "valid_authz": [
+            {
+                "access_grantee_id": r.access_grantee_id,
+                "expire_at": r.expire_at,
+            } for r in results
+        ]
+    }
+
+
+
+
 # ---- データ削除（関連認可も削除） ----
 @app.post("/delete_data/{data_id}")
-def delete_data(data_id: str, req: SignedDeleteCatalogRequest): 
-    db = next(get_db())
-    try:
+async def delete_data(data_id: str, req: SignedDeleteCatalogRequest, db: AsyncSession = Depends(get_db)):
+    # トランザクションスコープ (正常終了でcommit / 例外でrollback)
+    async with db.begin():
         # データ存在確認
-        entry = db.query(LocalCatalog).filter_by(data_id=data_id).first()
+        entry = await db.get(LocalCatalog, data_id)
         if not entry:
             raise HTTPException(status_code=404, detail="DataID not found.")
         # 各カラムの整合性を検証（リクエスト内容とDBの値が一致するか）
@@ -342,78 +456,84 @@ def delete_data(data_id: str, req: SignedDeleteCatalogRequest):
             raise HTTPException(status_code=400, detail="Request data does not match stored record.")
         # 有効期限切れと公開鍵を取得して署名検証
         check_expire_time(req.expire_time)
-        fetched_pubkey_pem = get_public_key(req.admin_id)
-        msg = data_id + req.description + req.admin_id + req.endpoint + req.expire_time
-        verify_signature(fetched_pubkey_pem, msg, req.signature)
-        
-        db.delete(entry)
-        db.commit()
-        return {"message": f"Data {data_id} and related AuthZ entries deleted."}
-    finally:
-        db.close()
+        fetched_pubkey_pem = await get_public_key(req.admin_id)
+        # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+        msg = b"".join((
+            data_id.encode(),
+            (req.description or "").encode(),
+            req.admin_id.encode(),
+            req.endpoint.encode(),
+            req.expire_time.encode(),
+        ))
+        await verify_signature(fetched_pubkey_pem, msg, req.signature)
+
+        # 単一のDELETE文で発行し、関連認可はPostgres側のON DELETE CASCADEで削除
+        await db.execute(delete(LocalCatalog).where(LocalCatalog.data_id == data_id))
+    # 再登録で管理者が変わりうるのでキャッシュを無効化 (commit後)
+    _admin_cache.pop(data_id, None)
+    return {"message": f"Data {data_id} and related AuthZ entries deleted."}
 
 
 # ---- 認可削除（該当のみ） ----
 @app.post("/delete_authz/{data_id}/{access_grantee_id}")
-def delete_authz(data_id: str, access_grantee_id: str, req: SignedDeleteAuthZRequest):
-    db = next(get_db())
-    try:
-        auth = db.query(LocalAuthorization).filter_by(
-            data_id=data_id, access_grantee_id=access_grantee_id
-        ).first()
+async def delete_authz(data_id: str, access_grantee_id: str, req: SignedDeleteAuthZRequest, db: AsyncSession = Depends(get_db)):
+    # トランザクションスコープ (正常終了でcommit / 例外でrollback)
+    async with db.begin():
+        auth = await db.get(LocalAuthorization, (data_id, access_grantee_id))
         if not auth:
             raise HTTPException(status_code=404, detail="AuthZ not found.")
         # 有効期限切れと公開鍵を取得して署名検証
         check_expire_time(req.expire_time)
-        admin_id = get_admin_id_by_data_id(db, data_id)
-        fetched_pubkey_pem = get_public_key(admin_id)
-        msg = data_id + access_grantee_id + req.expire_time
-        verify_signature(fetched_pubkey_pem, msg, req.signature)
-        
-        db.delete(auth)
-        db.commit()
-        return {"message": f"AuthZ for {access_grantee_id} on {data_id} deleted."}
-    finally:
-        db.close()
+        admin_id = await get_admin_id_by_data_id(db, data_id)
+        fetched_pubkey_pem = await get_public_key(admin_id)
+        # 署名対象メッセージは最初からbytesで組み立てる (encodeの二度手間を回避)
+        msg = b"".join((data_id.encode(), access_grantee_id.encode(), req.expire_time.encode()))
+        await verify_signature(fetched_pubkey_pem, msg, req.signature)
+
+        await db.delete(auth)
+    return {"message": f"AuthZ for {access_grantee_id} on {data_id} deleted."}
 
 
 # ---- 一覧取得 ----
 @app.get("/debug_all")
-def debug_all():
-    db = next(get_db())
-    try:
-        data = db.query(LocalCatalog).all()
-        authz = db.query(LocalAuthorization).all()
-        return {
-            "catalog_count": len(data),
-            "authz_count": len(authz),
-            "catalog": [
-                {
-                    "data_id": d.data_id,
-                    "admin_id": d.admin_id,
-                    "endpoint": d.endpoint,
-                    "created_at": d.created_at,
-                } for d in data
-            ],
-            "authz": [
-                {
-                    "data_id": a.data_id,
-                    "access_grantee_id": a.access_grantee_id,
-                    "expire_at": a.expire_at,
-                } for a in authz
-            ]
-        }
-    finally:
-        db.close()
+async def debug_all(limit: int = 100, offset: int = 0, db: AsyncSession = Depends(get_db)):
+    # 必要カラムだけのCore SELECT + ページング (全行のORMハイドレーションを回避)
+    data = (await db.execute(
+        select(LocalCatalog.data_id, LocalCatalog.admin_id,
+               LocalCatalog.endpoint, LocalCatalog.created_at)
+        .limit(limit).offset(offset)
+    )).all()
+    authz = (await db.execute(
+        select(LocalAuthorization.data_id, LocalAuthorization.access_grantee_id,
+               LocalAuthorization.expire_at)
+        .limit(limit).offset(offset)
+    )).all()
+    return {
+        "catalog_count": len(data),
+        "authz_count": len(authz),
+        "catalog": [
+            {
+                "data_id": d.data_id,
+                "admin_id": d.admin_id,
+                "endpoint": d.endpoint,
+                "created_at": d.created_at,
+            } for d in data
+        ],
+        "authz": [
+            {
+                "data_id": a.data_id,
+                "access_grantee_id": a.access_grantee_id,
+                "expire_at": a.expire_at,
+            } for a in authz
+        ]
+    }
 
 
 @app.post("/reset")
-def reset_all():
-    db = next(get_db())
-    try:
-        num_authz = db.query(LocalAuthorization).delete()
-        num_data = db.query(LocalCatalog).delete()
-        db.commit()
-        return {"message": f"Reset done: {num_data} catalog, {num_authz} authz removed."}
-    finally:
-        db.close()
+async def reset_all(db: AsyncSession = Depends(get_db)):
+    # トランザクションスコープ (正常終了でcommit / 例外でrollback)
+    async with db.begin():
+        num_authz = (await db.execute(delete(LocalAuthorization))).rowcount
+        num_data = (await db.execute(delete(LocalCatalog))).rowcount
+    _admin_cache.clear()
+    return {"message": f"Reset done: {num_data} catalog, {num_authz} authz removed."}
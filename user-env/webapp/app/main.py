@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from concurrent.futures import ThreadPoolExecutor
 import requests, base64, hashlib
 
 app = FastAPI(title="WebApp for Connector Dashboard")
@@ -8,6 +9,12 @@ templates = Jinja2Templates(directory="app/templates")
 
 CONNECTOR_URL = "http://host.docker.internal:51000"  # Connector API URL
 
+# Connector向けの共有セッション (keep-aliveでTCP接続を再利用)
+http = requests.Session()
+
+# ダッシュボード描画時の3つのバックエンド呼び出しを並行実行するためのプール
+_fetch_pool = ThreadPoolExecutor(max_workers=3)
+
 # ===== 共通関数 =====
 def hash_password(password: str) -> str:
     """SHA256 ハッシュ化（PoC用、saltなし）"""
@@ -40,15 +47,20 @@ def index(request: Request):
         try:
             headers = basic_auth_header(user_id, password_hash)
 
+            # 3つのConnector呼び出しは独立なので並行に発行 (合計RTT → 最大RTT)
+            fut_user = _fetch_pool.submit(http.get, f"{CONNECTOR_URL}/users/{user_id}", headers=headers)
+            fut_pk = _fetch_pool.submit(http.get, f"{CONNECTOR_URL}/debug_all_pk_users", headers=headers)
+            fut_search = _fetch_pool.submit(http.get, f"{CONNECTOR_URL}/search_by_keyword/IoT", headers=headers)
+
             # 1. Connector の /users/{user_id}
-            res_user = requests.get(f"{CONNECTOR_URL}/users/{user_id}", headers=headers)
+            res_user = fut_user.result()
             if res_user.status_code == 200:
                 user_info = res_user.json()
             else:
                 error = f"Failed to fetch user info: {res_user.status_code} {res_user.text}"
 
             # 2. Connector の /debug_all_pk_users
-            res_pk = requests.get(f"{CONNECTOR_URL}/debug_all_pk_users", headers=headers)
+            res_pk = fut_pk.result()
             if res_pk.status_code == 200:
                 registry_info = res_pk.json()
             else:
@@ -57,7 +69,7 @@ def index(request: Request):
                 error = (error or "") + f"Failed to fetch registry info: {res_pk.status_code}"
 
             # 3. Connector の /search_by_keyword/
-            res_pk = requests.get(f"{CONNECTOR_URL}/search_by_keyword/IoT", headers=headers)
+            res_pk = fut_search.result()
             if res_pk.status_code == 200:
                 search_result = res_pk.json()
             else:
@@ -88,7 +100,7 @@ def register_page(request: Request):
 @app.post("/register", response_class=HTMLResponse)
 def register_user(user_id: str = Form(...), password: str = Form(...)):
     password_hash = hash_password(password)
-    res = requests.post(f"{CONNECTOR_URL}/register", json={
+    res = http.post(f"{CONNECTOR_URL}/register", json={
         "user_id": user_id,
         "password_hash": password_hash
     })
@@ -106,7 +118,7 @@ def login_page(request: Request):
 @app.post("/login", response_class=HTMLResponse)
 def login_user(user_id: str = Form(...), password: str = Form(...)):
     password_hash = hash_password(password)
-    res = requests.post(f"{CONNECTOR_URL}/login", json={
+    res = http.post(f"{CONNECTOR_URL}/login", json={
         "user_id": user_id,
         "password_hash": password_hash
     })